@@ -0,0 +1,436 @@
+#!/usr/bin/python
+#
+# Script to fuzz/round-trip check the codecs in circuit_samples.py
+# and to compare (and time) a replacement implementation against them
+# (c) Simon Wood, GPLv2 or higher
+#
+
+import sys
+import os
+import random
+import tempfile
+import importlib
+
+from binascii import crc32
+
+from timeit import default_timer as timer
+
+import circuit_samples as reference
+
+#--------------------------------------------------
+class circuit_check(object):
+    # reference implementation is always the one in circuit_samples.py,
+    # 'candidate' is any class providing the same methods.
+
+    def __init__(self, candidate=None, seed=None, verbose=False):
+        self.candidate = candidate
+        self.ref = reference.circuit_samples()
+        if candidate:
+            self.cand = candidate()
+        else:
+            self.cand = None
+
+        self.rng = random.Random(seed)
+        self.verbose = verbose
+
+        self.checks = 0
+        self.failures = []
+        self.timing = {}
+
+    def randomBytes(self, length):
+        return(bytes(bytearray(self.rng.randint(0, 255)
+                for i in range(length))))
+
+    def fail(self, check, message):
+        self.failures.append("%s: %s" % (check, message))
+        if self.verbose:
+            print("FAIL %s: %s" % (check, message))
+
+    def implementations(self):
+        if self.cand:
+            return([self.ref, self.cand])
+        return([self.ref])
+
+    def label(self, impl):
+        if impl is self.ref:
+            return("ref")
+        return("cand")
+
+    def fresh(self, impl):
+        # readSysEx/writeSysEx keep offset/length/checksum on the instance,
+        # so SysEx work uses a new one each time to avoid carrying state
+        if impl is self.ref:
+            return(reference.circuit_samples())
+        return(self.candidate())
+
+    #--------------------------------------------------
+    # Correctness, any exception (including from a bad return type) is
+    # recorded as a failure so that the run carries on to the report.
+
+    def checkPack(self, count):
+        # 7bit pack/unpack, at every length modulo 7
+        for i in range(count):
+            for remainder in range(7):
+                data = self.randomBytes(7 * self.rng.randint(0, 64) + remainder)
+
+                refPacket = bytes(self.ref.pack(data))
+
+                packets = []
+                for impl in self.implementations():
+                    self.checks += 1
+                    check = "pack"
+                    try:
+                        packet = bytes(impl.pack(data))
+                        packets.append(packet)
+
+                        if len(packet) != len(data) + (len(data) + 6) // 7:
+                            self.fail("pack", "%s length %d packed to %d" %
+                                    (self.label(impl), len(data), len(packet)))
+                        if [x for x in bytearray(packet) if x & 0x80]:
+                            self.fail("pack", "%s length %d has MSB set" %
+                                    (self.label(impl), len(data)))
+
+                        if bytes(impl.unpack(packet)) != data:
+                            self.fail("pack", "%s length %d did not "
+                                    "round trip" % (self.label(impl), len(data)))
+
+                        check = "unpack"
+                        if bytes(impl.unpack(refPacket)) != data:
+                            self.fail("unpack", "%s length %d reference "
+                                    "packet unpacked badly" %
+                                    (self.label(impl), len(data)))
+                    except Exception as e:
+                        self.fail(check, "%s length %d raised %r" %
+                                (self.label(impl), len(data), e))
+
+                if len(packets) > 1 and packets[0] != packets[1]:
+                    self.fail("pack", "length %d differs from reference" %
+                            len(data))
+
+    def checkNyble(self, count):
+        # 32bit values packed into 8 nybles, full range plus the edges
+        values = [0, 1, 0x7FFFFFFF, 0x80000000, 0xFFFFFFFF,
+                reference.circuit_samples.offset,
+                reference.circuit_samples.maxLength]
+        values += [self.rng.randint(0, 0xFFFFFFFF) for i in range(count)]
+
+        for value in values:
+            packed = []
+            for impl in self.implementations():
+                self.checks += 1
+                check = "packNyble"
+                try:
+                    data = bytes(impl.packNyble(value))
+                    packed.append(data)
+
+                    if len(data) != 8 or [x for x in bytearray(data) if x > 0x0f]:
+                        self.fail("packNyble", "%s 0x%08x packed as %r" %
+                                (self.label(impl), value, data))
+
+                    check = "unpackNyble"
+                    result = impl.unpackNyble(data)
+                    if result != value:
+                        self.fail("unpackNyble", "%s 0x%08x unpacked as %r" %
+                                (self.label(impl), value, result))
+                except Exception as e:
+                    self.fail(check, "%s 0x%08x raised %r" %
+                            (self.label(impl), value, e))
+
+            if len(packed) > 1 and packed[0] != packed[1]:
+                self.fail("packNyble", "0x%08x differs from reference" % value)
+
+    def checkEndian(self, count):
+        # swapping twice is a no-op, width 1 (or unknown) is passed through
+        for i in range(count):
+            for width in [1, 2, 3, 4]:
+                data = self.randomBytes(width * self.rng.randint(0, 1024))
+
+                expected = b"".join([data[x:x + width][::-1]
+                        for x in range(0, len(data), width)])
+
+                for impl in self.implementations():
+                    self.checks += 1
+                    try:
+                        swapped = bytes(impl.endianSwap(data, width))
+                        if swapped != expected:
+                            self.fail("endianSwap", "%s width %d length %d" %
+                                    (self.label(impl), width, len(data)))
+                        elif bytes(impl.endianSwap(swapped, width)) != data:
+                            self.fail("endianSwap", "%s width %d length %d "
+                                    "did not round trip" %
+                                    (self.label(impl), width, len(data)))
+                    except Exception as e:
+                        self.fail("endianSwap", "%s width %d length %d "
+                                "raised %r" %
+                                (self.label(impl), width, len(data), e))
+
+    def randomBank(self):
+        samples = []
+        for i in range(self.rng.randint(0, 4)):
+            bits = self.rng.choice([8, 16, 24])
+            channels = self.rng.choice([1, 2])
+            frames = self.rng.randint(0, 2048)
+            data = self.randomBytes(frames * channels * bits // 8)
+
+            samples.append({
+                "channels": channels,
+                "bits": bits,
+                "rate": self.rng.choice([22050, 44100, 48000]),
+                "length": len(data),
+                "data": data })
+
+        return({"count": len(samples), "samples": samples})
+
+    def checkBank(self, count):
+        # build -> SysEx -> read -> parse, writing with each implementation
+        # and reading back with each implementation
+        if not reference._hasMido:
+            print("Mido not available, skipping SysEx round trip")
+            return
+
+        names = []
+        for impl in self.implementations():
+            handle, name = tempfile.mkstemp(suffix=".syx")
+            os.close(handle)
+            names.append(name)
+
+        try:
+            for i in range(count):
+                bank = self.randomBank()
+                sampleData = reference.CircuitSamples.build(bank)
+
+                written = []
+                refContents = None
+                for writer, name in zip(self.implementations(), names):
+                    self.checks += 1
+                    try:
+                        self.fresh(writer).writeSysEx(name, sampleData)
+                    except Exception as e:
+                        self.fail("writeSysEx", "%s raised %r" %
+                                (self.label(writer), e))
+                        continue
+
+                    infile = open(name, "rb")
+                    contents = infile.read()
+                    infile.close()
+
+                    # a file which differs from the reference is the writer's
+                    # fault, so failures reading it are reported against it
+                    check = "readSysEx"
+                    if writer is self.ref:
+                        refContents = contents
+                    elif refContents is not None and contents != refContents:
+                        self.fail("writeSysEx", "%s bank of %d samples "
+                                "differs from reference file" %
+                                (self.label(writer), bank['count']))
+                        check = "writeSysEx"
+                    written.append((writer, check, name))
+
+                for writer, check, name in written:
+                    for reader in self.implementations():
+                        self.checks += 1
+                        source = "%s reading %s" % (self.label(reader),
+                                self.label(writer))
+                        try:
+                            self.checkRead(check, source, name, bank,
+                                    sampleData, reader)
+                        except Exception as e:
+                            self.fail(check, "%s raised %r" % (source, e))
+        finally:
+            for name in names:
+                os.remove(name)
+
+    def checkRead(self, check, source, name, bank, sampleData, impl):
+        reader = self.fresh(impl)
+        readData = bytes(reader.readSysEx(name))
+
+        if readData != sampleData:
+            self.fail(check, "%s bank of %d samples (%d bytes) "
+                    "did not round trip" %
+                    (source, bank['count'], len(sampleData)))
+            return
+
+        if reader.offset != reference.circuit_samples.offset:
+            self.fail(check, "%s offset %r" % (source, reader.offset))
+        if reader.length != len(sampleData):
+            self.fail(check, "%s length %r != %d" %
+                    (source, reader.length, len(sampleData)))
+        if reader.checksum != crc32(sampleData):
+            self.fail(check, "%s checksum %r" % (source, reader.checksum))
+
+        samples = reference.CircuitSamples.parse(readData)
+        if samples['count'] != bank['count']:
+            self.fail("parse", "count %r != %d" %
+                    (samples['count'], bank['count']))
+            return
+
+        for got, want in zip(samples['samples'], bank['samples']):
+            for key in want.keys():
+                if got[key] != want[key]:
+                    self.fail("parse", "sample '%s' differs" % key)
+
+    #--------------------------------------------------
+    # Throughput, each implementation runs the same pre-generated inputs
+    # as a batch, best of 'repeat' with the order shuffled every repeat.
+
+    def benchmark(self, repeat, size):
+        data = [self.randomBytes(size) for i in range(16)]
+        total = 16 * size
+
+        values = [self.rng.randint(0, 0xFFFFFFFF) for i in range(16384)]
+        nybles = [bytes(self.ref.packNyble(x)) for x in values]
+
+        self.bench("pack", "pack", repeat, total,
+                [(x,) for x in data])
+        self.bench("unpack", "unpack", repeat, total,
+                [(bytes(self.ref.pack(x)),) for x in data])
+        self.bench("packNyble", "packNyble", repeat, 4 * len(values),
+                [(x,) for x in values])
+        self.bench("unpackNyble", "unpackNyble", repeat, 4 * len(values),
+                [(x,) for x in nybles])
+        for width in [2, 3, 4]:
+            words = [x[:len(x) - len(x) % width] for x in data]
+            self.bench("endianSwap%d" % width, "endianSwap", repeat,
+                    sum([len(x) for x in words]), [(x, width) for x in words])
+
+        if not reference._hasMido:
+            return
+
+        handle, name = tempfile.mkstemp(suffix=".syx")
+        os.close(handle)
+
+        try:
+            sampleData = data[0]
+            reference.circuit_samples().writeSysEx(name, sampleData)
+            self.bench("readSysEx", "readSysEx", repeat,
+                    8 * len(sampleData), [(name,)] * 8, True)
+
+            handle, outname = tempfile.mkstemp(suffix=".syx")
+            os.close(handle)
+            try:
+                self.bench("writeSysEx", "writeSysEx", repeat,
+                        8 * len(sampleData), [(outname, sampleData)] * 8,
+                        True)
+            finally:
+                os.remove(outname)
+        finally:
+            os.remove(name)
+
+    def bench(self, name, method, repeat, size, inputs, fresh=False):
+        impls = self.implementations()
+        best = [None] * len(impls)
+
+        for r in range(repeat):
+            order = list(range(len(impls)))
+            self.rng.shuffle(order)
+
+            for which in order:
+                if best[which] is False:
+                    continue
+                # new instances (if needed) are made outside of the timing
+                if fresh:
+                    funcs = [getattr(self.fresh(impls[which]), method)
+                            for args in inputs]
+                else:
+                    funcs = [getattr(impls[which], method)] * len(inputs)
+
+                try:
+                    start = timer()
+                    for func, args in zip(funcs, inputs):
+                        func(*args)
+                    elapsed = timer() - start
+                except Exception as e:
+                    self.fail(name, "%s raised %r while timing" %
+                            (self.label(impls[which]), e))
+                    best[which] = False
+                    continue
+
+                if best[which] is None or elapsed < best[which]:
+                    best[which] = elapsed
+
+        self.timing[name] = (method, size, best)
+
+    #--------------------------------------------------
+    def report(self):
+        for name in sorted(self.timing.keys()):
+            method, size, best = self.timing[name]
+            failed = [x for x in self.failures if x.startswith(method + ":")]
+
+            line = "%-12s ref %s" % (name, self.throughput(size, best[0]))
+            if len(best) > 1:
+                line += ", cand %s" % self.throughput(size, best[1])
+                if failed:
+                    line += " (FAILED)"
+                elif best[0] and best[1]:
+                    line += " (x%.2f)" % (best[0] / best[1])
+            print(line)
+
+        print("%d checks, %d failures" % (self.checks, len(self.failures)))
+        if self.failures:
+            print("First few failures:")
+            for failure in self.failures[:10]:
+                print("  " + failure)
+
+    def throughput(self, size, elapsed):
+        if elapsed:
+            return("%10.3f MB/s" % (size / elapsed / 1e6))
+        return("%10s MB/s" % "-")
+
+#--------------------------------------------------
+
+def loadCandidate(name):
+    # 'module.Class', module must be importable from current path
+    module, klass = name.rsplit(".", 1)
+    return(getattr(importlib.import_module(module), klass))
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    usage = "usage: %prog [options]"
+    parser = OptionParser(usage)
+
+    parser.add_option("-v", "--verbose",
+        action="store_true", dest="verbose")
+    parser.add_option("-c", "--candidate",
+        help="compare 'module.Class' against reference implementation",
+        dest="candidate")
+    parser.add_option("-s", "--seed", type="int",
+        help="random SEED, for repeatable runs",
+        dest="seed")
+    parser.add_option("-n", "--count", type="int",
+        help="number of iterations for each check",
+        dest="count", default=100)
+    parser.add_option("-b", "--banks", type="int",
+        help="number of random BANKS for SysEx round trip",
+        dest="banks", default=10)
+    parser.add_option("-t", "--timing", type="int",
+        help="best of TIMING repeats for throughput (0 to disable)",
+        dest="timing", default=5)
+    parser.add_option("-l", "--length", type="int",
+        help="LENGTH of each random block used for throughput",
+        dest="length", default=4096)
+
+    (options, args) = parser.parse_args()
+
+    if options.seed is None:
+        options.seed = random.randint(0, 0xFFFFFFFF)
+    print("Seed: %d" % options.seed)
+
+    candidate = None
+    if options.candidate:
+        candidate = loadCandidate(options.candidate)
+
+    check = circuit_check(candidate, options.seed, options.verbose)
+
+    check.checkPack(options.count)
+    check.checkNyble(options.count)
+    check.checkEndian(options.count)
+    check.checkBank(options.banks)
+
+    if options.timing > 0:
+        check.benchmark(options.timing, options.length)
+
+    check.report()
+
+    if check.failures:
+        sys.exit(1)
@@ -13,6 +13,22 @@ from binascii import crc32
 
 from construct import *
 
+# SysEx files are read/written via Mido
+# https://github.com/mido/mido
+
+import sys
+
+try:
+    import mido
+    _hasMido = True
+    if sys.platform == 'win32':
+        mido.set_backend('mido.backends.rtmidi_python')
+except ImportError:
+    _hasMido = False
+'''
+_hasMido = False
+'''
+
 CircuitSample = Struct(
     "channels" / Byte,
     "bits" / Byte,
@@ -180,17 +196,6 @@ if __name__ == "__main__":
 
     from optparse import OptionParser
 
-    try:
-        import mido
-        _hasMido = True
-        if sys.platform == 'win32':
-            mido.set_backend('mido.backends.rtmidi_python')
-    except ImportError:
-        _hasMido = False
-    '''
-    _hasMido = False
-    '''
-
     usage = "usage: %prog [options] FILENAME"
     parser = OptionParser(usage)
 